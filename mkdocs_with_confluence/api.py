@@ -0,0 +1,444 @@
+import contextlib
+import sys
+
+HASH_LABEL_PREFIX = "cicd_hash_"
+HASH_PROPERTY_KEY = "cicd_hash"
+SOURCE_LABEL_PREFIX = "cicd_src_"
+
+CONTENT_URL_FORMAT = "{base_url}/wiki/rest/api/content"
+CONVERT_URL_FORMAT = "{base_url}/wiki/rest/api/contentbody/convert/{to}"
+LABEL_URL_FORMAT = "{base_url}/wiki/rest/api/content/{id}/label"
+SEARCH_URL_FORMAT = "{base_url}/wiki/rest/api/content/search"
+
+V2_URL_FORMAT = "{base_url}/wiki/api/v2"
+
+# Confluence caps list endpoints at 250 results per request
+BULK_LIMIT = 250
+
+
+@contextlib.contextmanager
+def nostdout():
+    save_stdout = sys.stdout
+    sys.stdout = DummyFile()
+    yield
+    sys.stdout = save_stdout
+
+
+class DummyFile(object):
+    def write(self, x):
+        pass
+
+
+def chunks(items, size=BULK_LIMIT):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class ConfluenceV1Api(object):
+    """Confluence Cloud REST API v1 (/wiki/rest/api/content) backend.
+
+    Page lookups return plain dicts with ``id``, ``title``, ``version``,
+    ``parent_id``, ``hash`` and ``labels`` keys so the plugin does not depend
+    on the payload shape of a particular API version. The content hash of a
+    page is read with ``get_page_hash``, backends may leave ``hash`` empty.
+    """
+
+    def __init__(self, session, base_url, space):
+        self.session = session
+        self.base_url = base_url
+        self.space = space
+
+    def _get_json(self, url, **kwargs):
+        r = self.session.get(url, **kwargs)
+        r.raise_for_status()
+
+        with nostdout():
+            return r.json()
+
+    def _search(self, params):
+        # CQL search only exists in v1, so this is shared by every backend
+        url = SEARCH_URL_FORMAT.format(base_url=self.base_url)
+
+        while url:
+            response_json = self._get_json(url, params=params)
+
+            for result in response_json["results"]:
+                yield self._v1_page(result)
+
+            next_link = response_json.get("_links", {}).get("next")
+            if not next_link:
+                return
+
+            # v1 next links are relative to _links.base (".../wiki")
+            base = response_json["_links"].get("base", f"{self.base_url}/wiki")
+            url = base + next_link
+            params = None
+
+    def _v1_page(self, result):
+        labels = result.get("metadata", {}).get("labels", {}).get("results", [])
+        hash = [
+            x.get("name")
+            for x in labels
+            if x.get("prefix") == "global"
+            and x.get("name").startswith(HASH_LABEL_PREFIX)
+        ]
+        ancestors = result.get("ancestors") or [{}]
+
+        return {
+            "id": result["id"],
+            "title": result["title"],
+            "version": result.get("version", {}).get("number"),
+            "parent_id": ancestors[-1].get("id"),
+            "hash": hash[0].replace(HASH_LABEL_PREFIX, "") if hash else None,
+            "labels": [x.get("name") for x in labels],
+        }
+
+    def find_page(self, title):
+        url = CONTENT_URL_FORMAT.format(base_url=self.base_url)
+        params = {
+            "title": title,
+            "spaceKey": self.space,
+            "expand": "version,metadata.labels",
+        }
+
+        response_json = self._get_json(url, params=params)
+
+        if response_json["results"]:
+            return self._v1_page(response_json["results"][0])
+
+    def find_pages(self, titles):
+        pages = {}
+
+        # Titles are spelled out in the CQL query, keep the URL reasonably short
+        for batch in chunks(titles, 50):
+            quoted = ",".join(
+                '"' + t.replace("\\", "\\\\").replace('"', '\\"') + '"' for t in batch
+            )
+            params = {
+                "cql": f'space="{self.space}" and type=page and title in ({quoted})',
+                "expand": "version,metadata.labels",
+                "limit": BULK_LIMIT,
+            }
+            for page in self._search(params):
+                pages[page["title"]] = page
+
+        return pages
+
+    def find_pages_by_label(self, labels):
+        labels = set(labels)
+        pages = {}
+
+        for batch in chunks(sorted(labels), 50):
+            quoted = ",".join(f'"{label}"' for label in batch)
+            params = {
+                "cql": f'space="{self.space}" and type=page and label in ({quoted})',
+                "expand": "version,metadata.labels,ancestors",
+                "limit": BULK_LIMIT,
+            }
+            for page in self._search(params):
+                for label in labels.intersection(page["labels"]):
+                    pages[label] = page
+
+        return pages
+
+    def add_labels(self, page_id, labels):
+        url = LABEL_URL_FORMAT.format(base_url=self.base_url, id=page_id)
+        data = [{"prefix": "global", "name": label} for label in labels]
+
+        r = self.session.post(url, json=data)
+        r.raise_for_status()
+        return r
+
+    def get_page(self, page_id):
+        url = CONTENT_URL_FORMAT.format(base_url=self.base_url) + "/" + page_id
+        params = {"expand": "version,metadata.labels,ancestors"}
+
+        return self._v1_page(self._get_json(url, params=params))
+
+    def get_page_hash(self, page):
+        return page["hash"]
+
+    def get_parent_title(self, page_id):
+        url = CONTENT_URL_FORMAT.format(base_url=self.base_url) + "/" + page_id
+
+        response_json = self._get_json(url, params={"expand": "ancestors"})
+
+        if response_json and response_json["ancestors"]:
+            return response_json["ancestors"][-1]["title"]
+
+    def _labels(self, hash, labels):
+        return [
+            {"prefix": "global", "name": name}
+            for name in [f"{HASH_LABEL_PREFIX}{hash}"] + list(labels)
+        ]
+
+    def create_page(self, title, parent_id, body, representation, hash, labels=()):
+        url = CONTENT_URL_FORMAT.format(base_url=self.base_url) + "/"
+        data = {
+            "type": "page",
+            "title": title,
+            "space": {"key": self.space},
+            "ancestors": [{"id": parent_id}],
+            "body": {"storage": {"value": body, "representation": representation}},
+            "metadata": {"labels": self._labels(hash, labels)},
+        }
+
+        r = self.session.post(url, json=data)
+        r.raise_for_status()
+        return r
+
+    def update_page(
+        self,
+        page_id,
+        title,
+        body,
+        representation,
+        version,
+        hash,
+        labels=(),
+        parent_id=None,
+    ):
+        url = CONTENT_URL_FORMAT.format(base_url=self.base_url) + "/" + page_id
+        data = {
+            "id": page_id,
+            "title": title,
+            "type": "page",
+            "space": {"key": self.space},
+            "body": {"storage": {"value": body, "representation": representation}},
+            "version": {"number": version},
+            "metadata": {"labels": self._labels(hash, labels)},
+        }
+        if parent_id:
+            data["ancestors"] = [{"id": parent_id}]
+
+        r = self.session.put(url, json=data)
+        r.raise_for_status()
+        return r
+
+    def get_attachment(self, page_id, filename):
+        url = (
+            CONTENT_URL_FORMAT.format(base_url=self.base_url)
+            + "/"
+            + page_id
+            + "/child/attachment"
+        )
+        headers = {"X-Atlassian-Token": "no-check"}
+
+        response_json = self._get_json(
+            url, headers=headers, params={"filename": filename, "expand": "version"}
+        )
+        if response_json["size"]:
+            return response_json["results"][0]
+
+    def create_attachment(self, page_id, filename, content, content_type, message):
+        url = (
+            CONTENT_URL_FORMAT.format(base_url=self.base_url)
+            + "/"
+            + page_id
+            + "/child/attachment"
+        )
+        headers = {"X-Atlassian-Token": "no-check"}
+        files = {"file": (filename, content, content_type), "comment": message}
+
+        r = self.session.post(url, headers=headers, files=files)
+        r.raise_for_status()
+        return r
+
+    def update_attachment(
+        self, page_id, attachment_id, filename, content, content_type, message
+    ):
+        url = (
+            CONTENT_URL_FORMAT.format(base_url=self.base_url)
+            + "/"
+            + page_id
+            + "/child/attachment/"
+            + attachment_id
+            + "/data"
+        )
+        headers = {"X-Atlassian-Token": "no-check"}
+        files = {"file": (filename, content, content_type), "comment": message}
+
+        r = self.session.post(url, headers=headers, files=files)
+        r.raise_for_status()
+        return r
+
+    def convert(self, body, from_type, to_type):
+        url = CONVERT_URL_FORMAT.format(base_url=self.base_url, to=to_type)
+        headers = {"Accept": "application/json", "Content-Type": "application/json"}
+        data = {"value": body, "representation": from_type}
+
+        r = self.session.post(url, json=data, headers=headers)
+        r.raise_for_status()
+        return r.json()["value"]
+
+
+class ConfluenceV2Api(ConfluenceV1Api):
+    """Confluence Cloud REST API v2 (/wiki/api/v2) backend.
+
+    Pages are looked up through the lightweight v2 page endpoints with cursor
+    pagination, and the content hash is kept in a page property instead of a
+    label, fetched only when a page update is compared. Body conversion,
+    attachment uploads, labels and the label search have no v2 equivalent and
+    stay on the v1 endpoints.
+    """
+
+    def __init__(self, session, base_url, space):
+        super().__init__(session, base_url, space)
+        self.api_url = V2_URL_FORMAT.format(base_url=base_url)
+        self._space_id = None
+        self._hash_properties = {}
+
+    def _paginate(self, url, params=None):
+        while url:
+            response_json = self._get_json(url, params=params)
+
+            for result in response_json["results"]:
+                yield result
+
+            next_link = response_json.get("_links", {}).get("next")
+            if not next_link:
+                return
+
+            url = self.base_url + next_link
+            params = None
+
+    @property
+    def space_id(self):
+        if self._space_id is None:
+            response_json = self._get_json(
+                f"{self.api_url}/spaces", params={"keys": self.space}
+            )
+            self._space_id = response_json["results"][0]["id"]
+        return self._space_id
+
+    def _v2_page(self, result):
+        # The hash lives in a separate property, see get_page_hash
+        return {
+            "id": result["id"],
+            "title": result["title"],
+            "version": result.get("version", {}).get("number"),
+            "parent_id": result.get("parentId"),
+            "hash": None,
+            "labels": None,
+        }
+
+    def _get_hash(self, page_id):
+        response_json = self._get_json(
+            f"{self.api_url}/pages/{page_id}/properties",
+            params={"key": HASH_PROPERTY_KEY},
+        )
+
+        if response_json["results"]:
+            self._hash_properties[page_id] = response_json["results"][0]
+            return response_json["results"][0]["value"]
+
+    def _set_hash(self, page_id, hash):
+        url = f"{self.api_url}/pages/{page_id}/properties"
+        prop = self._hash_properties.get(page_id)
+
+        if prop:
+            data = {
+                "key": HASH_PROPERTY_KEY,
+                "value": hash,
+                "version": {"number": prop["version"]["number"] + 1},
+            }
+            r = self.session.put(f"{url}/{prop['id']}", json=data)
+        else:
+            r = self.session.post(url, json={"key": HASH_PROPERTY_KEY, "value": hash})
+
+        r.raise_for_status()
+        self._hash_properties[page_id] = r.json()
+
+    def find_page(self, title):
+        params = {"space-id": self.space_id, "title": title, "status": "current"}
+
+        for result in self._paginate(f"{self.api_url}/pages", params):
+            return self._v2_page(result)
+
+    def find_pages(self, titles):
+        # v2 cannot filter by several titles at once, list the space instead
+        titles = set(titles)
+        params = {"space-id": self.space_id, "status": "current", "limit": BULK_LIMIT}
+
+        return {
+            r["title"]: self._v2_page(r)
+            for r in self._paginate(f"{self.api_url}/pages", params)
+            if r["title"] in titles
+        }
+
+    def get_page(self, page_id):
+        return self._v2_page(self._get_json(f"{self.api_url}/pages/{page_id}"))
+
+    def get_page_hash(self, page):
+        # Always read the property afresh, a concurrent update may have changed it
+        return self._get_hash(page["id"])
+
+    def get_parent_title(self, page_id):
+        page = self._get_json(f"{self.api_url}/pages/{page_id}")
+
+        if page.get("parentId"):
+            parent = self._get_json(f"{self.api_url}/pages/{page['parentId']}")
+            return parent["title"]
+
+    def create_page(self, title, parent_id, body, representation, hash, labels=()):
+        data = {
+            "spaceId": self.space_id,
+            "status": "current",
+            "title": title,
+            "parentId": parent_id,
+            "body": {"representation": representation, "value": body},
+        }
+
+        r = self.session.post(f"{self.api_url}/pages", json=data)
+        r.raise_for_status()
+
+        page_id = r.json()["id"]
+        self._set_hash(page_id, hash)
+        if labels:
+            self.add_labels(page_id, labels)
+        return r
+
+    def update_page(
+        self,
+        page_id,
+        title,
+        body,
+        representation,
+        version,
+        hash,
+        labels=(),
+        parent_id=None,
+    ):
+        data = {
+            "id": page_id,
+            "status": "current",
+            "title": title,
+            "body": {"representation": representation, "value": body},
+            "version": {"number": version},
+        }
+        if parent_id:
+            data["parentId"] = parent_id
+
+        r = self.session.put(f"{self.api_url}/pages/{page_id}", json=data)
+        r.raise_for_status()
+
+        # The property id and version are needed to overwrite an existing hash
+        if page_id not in self._hash_properties:
+            self._get_hash(page_id)
+        self._set_hash(page_id, hash)
+        if labels:
+            self.add_labels(page_id, labels)
+        return r
+
+    def get_attachment(self, page_id, filename):
+        response_json = self._get_json(
+            f"{self.api_url}/pages/{page_id}/attachments",
+            params={"filename": filename},
+        )
+
+        if response_json["results"]:
+            return response_json["results"][0]
+
+
+API_BACKENDS = {"v1": ConfluenceV1Api, "v2": ConfluenceV2Api}
@@ -1,24 +1,31 @@
 import time
 import os
 import hashlib
-import sys
 import re
 import requests
 import mimetypes
 import mistune
+import json
 import contextlib
+import posixpath
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from mkdocs.config import config_options
+from mkdocs.exceptions import PluginError
 from mkdocs.plugins import BasePlugin
-from md2cf.confluence_renderer import ConfluenceRenderer
 from os import environ
 from pathlib import Path
 from mkdocs.plugins import get_plugin_logger
+from mkdocs_with_confluence.api import API_BACKENDS, SOURCE_LABEL_PREFIX
+from mkdocs_with_confluence.renderer import PageLinkRenderer, resolve_page_link
+from mkdocs_with_confluence.tracing import Tracer, TracedSession
 
-log = get_plugin_logger(__name__)
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # Python < 3.8
+    from importlib_metadata import version, PackageNotFoundError
 
-CONTENT_URL_FORMAT = "{base_url}/wiki/rest/api/content"
-CONVERT_URL_FORMAT = "{base_url}/wiki/rest/api/contentbody/convert/{to}"
-LABEL_URL_FORMAT = "{base_url}/wiki/rest/api/content/{id}/label"
+log = get_plugin_logger(__name__)
 
 PARENT_TEMPLATE = """
 {pagetree:root=@self|startDepth=3}
@@ -27,20 +34,20 @@ MERMAID_TEMPLATE = """
 {mermaid-cloud:filename=FILE|revision=1}
 """
 MERMAID_FORMAT = "000MERMAID_CODE000{file}000"
-HASH_LABEL_PREFIX = "cicd_hash_"
-
-
-@contextlib.contextmanager
-def nostdout():
-    save_stdout = sys.stdout
-    sys.stdout = DummyFile()
-    yield
-    sys.stdout = save_stdout
-
-
-class DummyFile(object):
-    def write(self, x):
-        pass
+IMAGE_RE = r"!\[[\w\. -]*\]\((?!http|file)([^\s,]*).*\)"
+LINK_HREF_RE = r"\]\(\s*<?([^\s)>]+)|^ {0,3}\[[^\]]+\]:\s*<?([^\s>]+)"
+FINGERPRINT_CONFIG_KEYS = (
+    "host_url",
+    "space",
+    "parent_page_name",
+    "disable_cleanup",
+    "api_version",
+)
+
+try:
+    PLUGIN_VERSION = version("mkdocs-with-confluence")
+except PackageNotFoundError:
+    PLUGIN_VERSION = "unknown"
 
 
 class BearerAuth(requests.auth.AuthBase):
@@ -73,15 +80,42 @@ class MkdocsWithConfluence(BasePlugin):
         ("dryrun", config_options.Type(bool, default=False)),
         ("sleep_time", config_options.Type(float, default=5.0)),
         ("timeout", config_options.Type(float, default=30.0)),
+        ("trace_file", config_options.Type(str, default=None)),
+        ("cache_file", config_options.Type(str, default=None)),
+        ("api_version", config_options.Choice(tuple(API_BACKENDS), default="v1")),
+        ("max_workers", config_options.Type(int, default=4)),
+        ("conflict_retries", config_options.Type(int, default=3)),
+        (
+            "git_diff_base",
+            config_options.Type(str, default=environ.get("MKDOCS_CONFLUENCE_GIT_BASE")),
+        ),
+        ("git_diff_marker", config_options.Type(str, default=None)),
+        ("write_generated_attachments", config_options.Type(bool, default=False)),
+        (
+            "shard",
+            config_options.Type(str, default=environ.get("MKDOCS_CONFLUENCE_SHARD")),
+        ),
     )
 
     def __init__(self):
         self.enabled = True
-        self.confluence_renderer = ConfluenceRenderer(use_xhtml=True)
+        self.confluence_renderer = PageLinkRenderer(use_xhtml=True)
         self.confluence_mistune = mistune.Markdown(renderer=self.confluence_renderer)
         self.flen = 1
-        self.session = requests.Session()
+        self.tracer = Tracer()
+        self.session = TracedSession(self.tracer)
         self.page_attachments = {}
+        self.generated_attachments = {}
+        self.page_cache = {}
+        self.parent_page_ids = {}
+        self.shard = None
+        self.page_links = []
+        self.unresolved_links = []
+        self.exported_titles = set()
+        self.source_pages = {}
+        self.conflicts = []
+        self.changed_files = None
+        self.failed_pages = []
 
     def on_nav(self, nav, config, files):
         navigation_items = nav.__repr__()
@@ -117,7 +151,57 @@ class MkdocsWithConfluence(BasePlugin):
                     self.section_local_name = self.__get_section_title(n)
                     self.section_title = self.section_local_name
 
+        pages = []
+        if self.enabled:
+            with self.tracer.span("read_pages", cat="hook"):
+                pages = self.__read_pages(files, config)
+
+            self.confluence_renderer.page_titles = {
+                p.file.src_uri: p.title for p in pages
+            }
+
+        # Shard workers only look parents up, shard 0 created them beforehand.
+        # Selective publishing creates missing parents per page instead, except
+        # on shard 0: an auto-generated nav can gain sections without a config
+        # change, and the workers that publish into them cannot create them.
+        if (
+            self.enabled
+            and not self.is_shard_worker
+            and (self.changed_files is None or self.shard is not None)
+        ):
+            # Only sections holding a page that will be exported become parents.
+            # Shard 0 creates them for the pages of every shard.
+            exported_pages = [
+                p
+                for p in pages
+                if self.is_enabled_page(p) and self.is_changed_page(p, p.markdown)
+            ]
+            try:
+                with self.tracer.span("create_parent_hierarchy", cat="hook"):
+                    self.__create_parent_hierarchy(
+                        self.__get_section_levels(exported_pages)
+                    )
+            except Exception as e:
+                log.warning(f"Error creating parent pages from nav: {str(e)}")
+
+        if self.enabled and not (self.shard and self.shard[0] == 0):
+            try:
+                with self.tracer.span("find_source_pages", cat="hook"):
+                    self.source_pages = self.api.find_pages_by_label(
+                        [
+                            self.__get_source_label(p.file.src_uri)
+                            for p in nav.pages
+                            if self.changed_files is None
+                            or p.file.src_uri in self.changed_files
+                        ]
+                    )
+            except Exception as e:
+                log.warning(f"Error looking up pages by source path: {str(e)}")
+
     def on_files(self, files, config):
+        with self.tracer.span("git_diff", cat="hook"):
+            self.changed_files = self.__get_changed_files(config)
+
         pages = files.documentation_pages()
         try:
             self.flen = len(pages)
@@ -132,6 +216,21 @@ class MkdocsWithConfluence(BasePlugin):
         log.debug("Start exporting markdown pages...")
 
     def on_config(self, config):
+        if self.config["trace_file"]:
+            log.info(f"Tracing turned ON, writing to {self.config['trace_file']}")
+            self.tracer.enable()
+
+        if self.config["cache_file"]:
+            self.page_cache = self.__load_page_cache(self.config["cache_file"])
+
+        if self.config["shard"]:
+            self.shard = self.__parse_shard(self.config["shard"])
+
+        self.confluence_renderer.space = self.config["space"]
+        self.api = API_BACKENDS[self.config["api_version"]](
+            self.session, self.config["host_url"], self.config["space"]
+        )
+
         if "enabled_if_env" in self.config:
             env_name = self.config["enabled_if_env"]
             if env_name:
@@ -162,6 +261,12 @@ class MkdocsWithConfluence(BasePlugin):
             log.info("Exporting Mkdocs pages to Confluence turned ON by default!")
             self.enabled = True
 
+    @property
+    def main_parent(self):
+        if self.config["parent_page_name"] is not None:
+            return self.config["parent_page_name"]
+        return self.config["space"]
+
     @property
     def dryrun(self):
         if "_dryrun" not in dir(self):
@@ -172,13 +277,58 @@ class MkdocsWithConfluence(BasePlugin):
                 self._dryrun = False
         return self._dryrun
 
+    @property
+    def is_shard_worker(self):
+        return self.shard is not None and self.shard[0] != 0
+
     def is_enabled_page(self, page):
         return str(page.meta.get("mkdocs_with_confluence_skip")).lower() != "true"
 
+    def is_changed_page(self, page, markdown):
+        if self.changed_files is None or page.file.src_uri in self.changed_files:
+            return True
+
+        # Pages also depend on the images they embed, '#n' selects a drawio page
+        page_dir = posixpath.dirname(page.file.src_uri)
+        for match in re.finditer(IMAGE_RE, markdown):
+            image = match.group(1).split("#")[0]
+            if (
+                posixpath.normpath(posixpath.join(page_dir, image))
+                in self.changed_files
+            ):
+                return True
+
+        log.debug(f"Page '{page.title}' not changed since the git diff base. SKIP!")
+
+        return False
+
+    def is_shard_page(self, page):
+        if self.shard is None:
+            return True
+
+        index, count = self.shard
+        if index == 0:
+            return False
+
+        # Hash the directory rather than the file so a section stays on one worker
+        section = page.file.src_uri.rpartition("/")[0]
+        section_hash = int(self.__get_text_md5(section or "/"), 16)
+
+        return section_hash % count == index - 1
+
     def on_page_markdown(self, markdown, page, config, files):
+        with self.tracer.span("on_page_markdown", cat="hook", page=page.title):
+            return self.__export_page(markdown, page, config, files)
+
+    def __export_page(self, markdown, page, config, files):
         MkdocsWithConfluence._id += 1
 
-        if self.enabled and self.is_enabled_page(page):
+        if (
+            self.enabled
+            and self.is_enabled_page(page)
+            and self.is_shard_page(page)
+            and self.is_changed_page(page, markdown)
+        ):
             log.info(f"Page export progress: {MkdocsWithConfluence._id} / {self.flen}")
 
             if not all(self.config_scheme):
@@ -201,103 +351,102 @@ class MkdocsWithConfluence(BasePlugin):
                 if not parent:
                     parent = self.config["parent_page_name"]
 
-                if self.config["parent_page_name"] is not None:
-                    main_parent = self.config["parent_page_name"]
-                else:
-                    main_parent = self.config["space"]
-
-                log.debug("Get section second parent title...: ")
+                main_parent = self.main_parent
 
-                try:
-                    parent1 = self.__get_section_title(page.ancestors[1].__repr__())
-                except IndexError as e:
-                    log.debug(
-                        f"ERR({e}) No second parent! Assuming "
-                        f"second parent is main parent: {main_parent}..."
-                    )
+                log.debug(f"Parent0= {parent}, Main parent={main_parent}")
 
-                    parent1 = None
+                fingerprint = self.__get_page_fingerprint(
+                    markdown, page, [parent, main_parent]
+                )
+                cached_page = self.page_cache.get(page.file.src_uri)
 
-                if not parent1:
-                    parent1 = main_parent
+                if cached_page and cached_page["fingerprint"] == fingerprint:
+                    log.debug(f"Page '{page.title}' unchanged since last export. SKIP!")
 
-                    log.debug(
-                        f"Only one parent found. Assuming as a "
-                        f"first node after main parent config {main_parent}"
-                    )
+                    if cached_page["attachments"]:
+                        self.page_attachments[page.title] = [
+                            tuple(a) for a in cached_page["attachments"]
+                        ]
 
-                log.debug(
-                    f"Parent0= {parent}, Parent1={parent1}, Main parent={main_parent}"
-                )
+                    return markdown
 
                 site_dir = config.get("site_dir")
 
                 attachments = []
+                generated_attachments = []
 
-                ###############################################
-                log.debug("Processing images in markdown")
-                ###############################################
-                try:
-                    for match in re.finditer(r'img src="file://(.*)" s', markdown):
-                        log.debug(f"Found image: {match.group(1)}")
+                with self.tracer.span("preprocess", cat="preprocess"):
+                    ###############################################
+                    log.debug("Processing images in markdown")
+                    ###############################################
+                    try:
+                        for match in re.finditer(r'img src="file://(.*)" s', markdown):
+                            log.debug(f"Found image: {match.group(1)}")
 
-                        attachment_name = match.group(1)
-                        attachment_path = attachment_name
+                            attachment_name = match.group(1)
+                            attachment_path = attachment_name
 
-                        attachments.append((attachment_name, attachment_path))
+                            attachments.append((attachment_name, attachment_path))
 
-                    for match in re.finditer(
-                        r"!\[[\w\. -]*\]\((?!http|file)([^\s,]*).*\)", markdown
-                    ):
-                        file_path = match.group(1).lstrip("./\\")
+                        for match in re.finditer(IMAGE_RE, markdown):
+                            file_path = match.group(1).lstrip("./\\")
 
-                        attachment_name = file_path
-                        attachment_path = file_path
+                            attachment_name = file_path
+                            attachment_path = file_path
 
-                        darwio_image = re.search(r"(.*)\.drawio#(\d+)", file_path)
+                            darwio_image = re.search(r"(.*)\.drawio#(\d+)", file_path)
 
-                        if darwio_image:
-                            attachment_path = f"{darwio_image.group(1)}.drawio-{darwio_image.group(2)}.png"
+                            if darwio_image:
+                                attachment_path = f"{darwio_image.group(1)}.drawio-{darwio_image.group(2)}.png"
 
-                        attachments.append((attachment_name, attachment_path))
+                            attachments.append((attachment_name, attachment_path))
 
-                        log.debug(f"FOUND IMAGE: {file_path}")
+                            log.debug(f"FOUND IMAGE: {file_path}")
 
-                    new_markdown = re.sub(
-                        r'<img src="file:///tmp/',
-                        '<p><ac:image ac:height="350"><ri:attachment ri:filename="',
-                        markdown,
-                    )
-                    new_markdown = re.sub(
-                        r'" style="page-break-inside: avoid;">',
-                        '"/></ac:image></p>',
-                        new_markdown,
-                    )
-                except AttributeError as e:
-                    log.debug(f"WARN(({e}): No images found in markdown. Proceed..")
+                        new_markdown = re.sub(
+                            r'<img src="file:///tmp/',
+                            '<p><ac:image ac:height="350"><ri:attachment ri:filename="',
+                            markdown,
+                        )
+                        new_markdown = re.sub(
+                            r'" style="page-break-inside: avoid;">',
+                            '"/></ac:image></p>',
+                            new_markdown,
+                        )
+                    except AttributeError as e:
+                        log.debug(f"WARN(({e}): No images found in markdown. Proceed..")
 
-                confluence_body_changes = []
+                    confluence_body_changes = []
 
-                ###############################################
-                log.debug("Processing mermaid code blocks")
-                ###############################################
-                try:
-                    mermaid_re = r"```mermaid\n([^`]+)\n```"
+                    ###############################################
+                    log.debug("Processing mermaid code blocks")
+                    ###############################################
+                    try:
+                        mermaid_re = r"```mermaid\n([^`]+)\n```"
 
-                    mermaid_counter = 1
+                        mermaid_counter = 1
 
-                    for match in re.finditer(mermaid_re, new_markdown):
-                        mermaid_code = match.group(1)
+                        for match in re.finditer(mermaid_re, new_markdown):
+                            mermaid_code = match.group(1)
 
-                        title_id = self.__get_text_md5(page.title)
-                        attachment_name = f"mermaid-{title_id}-{mermaid_counter}.txt"
-                        attachment_path = attachment_name
-                        attachment_file = f"{site_dir}/{attachment_name}"
+                            title_id = self.__get_text_md5(page.title)
+                            attachment_name = (
+                                f"mermaid-{title_id}-{mermaid_counter}.txt"
+                            )
+                            content = mermaid_code.encode("utf-8")
 
-                        with open(attachment_file, "w") as f:
-                            f.write(mermaid_code)
+                            generated_attachments.append(
+                                (
+                                    attachment_name,
+                                    content,
+                                    hashlib.sha1(content).hexdigest(),
+                                )
+                            )
 
-                            attachments.append((attachment_name, attachment_path))
+                            if self.config["write_generated_attachments"]:
+                                attachment_file = f"{site_dir}/{attachment_name}"
+                                with open(attachment_file, "wb") as f:
+                                    f.write(content)
 
                             swap_id = MERMAID_FORMAT.format(file=attachment_name)
 
@@ -312,13 +461,15 @@ class MkdocsWithConfluence(BasePlugin):
                                 )
                             )
 
-                            new_markdown = re.sub(mermaid_re, swap_id, new_markdown)
+                            new_markdown = re.sub(
+                                mermaid_re, swap_id, new_markdown, count=1
+                            )
 
                             log.debug(f"Found mermaid code #{mermaid_counter}")
 
                             mermaid_counter += 1
-                except Exception as e:
-                    log.debug(f"WARN(({e}): Error processing mermaid. Proceed..")
+                    except Exception as e:
+                        log.debug(f"WARN(({e}): Error processing mermaid. Proceed..")
 
                 if not self.config["disable_cleanup"]:
                     ###############################################
@@ -332,7 +483,17 @@ class MkdocsWithConfluence(BasePlugin):
                 ###############################################
                 log.debug("Converting Markdown to Confluence")
                 ###############################################
-                confluence_body = self.confluence_mistune(new_markdown)
+                with self.tracer.span("convert_markdown", cat="convert"):
+                    # Links to other pages are resolved by the renderer
+                    self.confluence_renderer.reinit(page.file.src_uri)
+                    confluence_body = self.confluence_mistune(new_markdown)
+
+                self.page_links += [
+                    (page.title, t) for t in self.confluence_renderer.page_links
+                ]
+                self.unresolved_links += [
+                    (page.title, h) for h in self.confluence_renderer.unresolved_links
+                ]
 
                 ###############################################
                 log.debug("Modify Confluence body")
@@ -349,8 +510,35 @@ class MkdocsWithConfluence(BasePlugin):
                 log.debug(f"parent: {parent}")
                 log.debug(f"body: {confluence_body}")
 
-                page_id, _ = self.find_page_id(page.title)
-                if page_id is not None:
+                source_label = self.__get_source_label(page.file.src_uri)
+                existing_page = self.source_pages.get(source_label)
+
+                if existing_page is not None:
+                    ###############################################
+                    log.debug("Updating previous page found by source path")
+                    ###############################################
+                    if existing_page["title"] != page.title:
+                        log.info(
+                            f"Page '{existing_page['title']}' was renamed to '{page.title}'"
+                        )
+
+                    # Nav moves are applied in place, unknown parents are left as is
+                    parent_id = self.__resolve_parent_id(page, parent)
+                    if parent_id == existing_page["parent_id"]:
+                        parent_id = None
+
+                    if not self.update_page(
+                        page.title,
+                        confluence_body,
+                        page=existing_page,
+                        parent_id=parent_id,
+                        source_label=source_label,
+                    ):
+                        self.failed_pages.append(page.title)
+                        return markdown
+
+                    self.exported_titles.add(page.title)
+                elif self.find_page_id(page.title)[0] is not None:
                     ###############################################
                     log.debug("Updating previous page")
                     ###############################################
@@ -363,56 +551,32 @@ class MkdocsWithConfluence(BasePlugin):
                         )
                         return markdown
 
-                    self.update_page(page.title, confluence_body)
+                    if not self.update_page(
+                        page.title, confluence_body, source_label=source_label
+                    ):
+                        self.failed_pages.append(page.title)
+                        return markdown
+
+                    self.exported_titles.add(page.title)
                 else:
                     ###############################################
                     log.debug("Creating mew page")
                     ###############################################
-                    main_parent_id, _ = self.find_page_id(main_parent)
-
-                    def find_parent_id():
-                        return self.find_page_id(parent)
-
-                    def find_second_parent_id():
-                        return self.find_page_id(parent1)
-
-                    parent_id, _ = self.wait_until(find_parent_id)
-                    second_parent_id, _ = self.wait_until(find_second_parent_id)
+                    parent_id = self.__resolve_parent_id(page, parent)
 
                     if not parent_id:
-                        ###############################################
-                        log.debug("Creating parent page(s)")
-                        ###############################################
-
-                        if not second_parent_id:
-                            main_parent_id, _ = self.find_page_id(main_parent)
-                            if not main_parent_id:
-                                log.warning("Main parent unknown. Aborting!")
-                                return markdown
-
-                            log.debug(
-                                f"Trying to Add page '{parent1}' to "
-                                f"main parent({main_parent}) ID: {main_parent_id}"
-                            )
-
-                            body = PARENT_TEMPLATE.replace("TEMPLATE", parent1)
-
-                            self.add_page(parent1, main_parent_id, body, format="wiki")
-
-                            second_parent_id = self.wait_until(find_second_parent_id)
-
-                        log.debug(
-                            f"Trying to Add page '{parent}' "
-                            f"to parent1({parent1}) ID: {second_parent_id}"
-                        )
-
-                        body = PARENT_TEMPLATE.replace("TEMPLATE", parent)
-
-                        self.add_page(parent, second_parent_id, body, format="wiki")
+                        log.warning(f"Parent '{parent}' unknown. Aborting!")
+                        self.failed_pages.append(page.title)
+                        return markdown
 
-                        parent_id = self.wait_until(find_parent_id)
+                    self.add_page(
+                        page.title,
+                        parent_id,
+                        confluence_body,
+                        source_label=source_label,
+                    )
 
-                    self.add_page(page.title, parent_id, confluence_body)
+                    self.exported_titles.add(page.title)
 
                     log.info(
                         f"Trying to Add page '{page.title}' to parent0({parent}) ID: {parent_id}"
@@ -421,17 +585,55 @@ class MkdocsWithConfluence(BasePlugin):
                 if attachments:
                     self.page_attachments[page.title] = attachments
 
+                if generated_attachments:
+                    self.generated_attachments[page.title] = generated_attachments
+
+                if self.config["cache_file"] and not self.dryrun:
+                    self.page_cache[page.file.src_uri] = {
+                        "fingerprint": fingerprint,
+                        "attachments": attachments,
+                    }
+
                 self.wait()
             except Exception as e:
                 log.warning(
                     f"Error with on_page_markdown for page '{page.title}': {str(e)}"
                 )
+                self.failed_pages.append(page.title)
 
                 return markdown
 
         return markdown
 
     def on_post_build(self, config):
+        with self.tracer.span("on_post_build", cat="hook"):
+            self.__upload_attachments(config)
+
+            if self.enabled:
+                self.__report_page_links()
+                self.__report_conflicts()
+
+        if self.config["cache_file"] and self.enabled:
+            self.__save_page_cache(self.config["cache_file"], self.page_cache)
+
+        if self.config["git_diff_marker"] and self.enabled and not self.dryrun:
+            if self.shard and self.shard[0] == 0:
+                # Shard 0 publishes no pages, only the workers know if theirs failed
+                log.debug(f"Shard 0 does not advance {self.config['git_diff_marker']}")
+            elif self.failed_pages:
+                log.warning(
+                    f"{len(self.failed_pages)} page(s) failed to publish, "
+                    f"not advancing {self.config['git_diff_marker']}"
+                )
+            else:
+                self.__save_git_diff_marker(
+                    self.config["git_diff_marker"], config["docs_dir"]
+                )
+
+        if self.config["trace_file"]:
+            self.tracer.dump(self.config["trace_file"])
+
+    def __upload_attachments(self, config):
         site_dir = config.get("site_dir")
 
         for title, attachments in self.page_attachments.items():
@@ -442,13 +644,239 @@ class MkdocsWithConfluence(BasePlugin):
                 log.debug(f"Looking for {attachment_name} in {site_dir}")
 
                 for p in Path(site_dir).rglob(f"*{attachment_path}"):
-                    self.add_or_update_attachment(title, attachment_name, p)
+                    with self.tracer.span("attachment", page=title, file=str(p)):
+                        self.add_or_update_attachment(title, attachment_name, p)
 
                     self.wait()
 
+        for title, attachments in self.generated_attachments.items():
+            log.debug(f"Uploading generated attachments to confluence for {title}:")
+
+            for attachment_name, content, file_hash in attachments:
+                with self.tracer.span("attachment", page=title, file=attachment_name):
+                    self.add_or_update_attachment(
+                        title,
+                        attachment_name,
+                        attachment_name,
+                        content=content,
+                        file_hash=file_hash,
+                    )
+
+                self.wait()
+
+    def __report_page_links(self):
+        # Targets published in this build exist; resolve the rest in one bulk lookup
+        pending = {t for _, t in self.page_links if t not in self.exported_titles}
+        if pending and not self.dryrun:
+            pending -= set(self.api.find_pages(pending))
+
+        unresolved = [f"{title}: {link}" for title, link in self.unresolved_links] + [
+            f"{title}: '{t}'" for title, t in self.page_links if t in pending
+        ]
+
+        if unresolved:
+            log.warning(
+                f"{len(unresolved)} link(s) could not be resolved to Confluence pages:\n  "
+                + "\n  ".join(unresolved)
+            )
+
+    def __report_conflicts(self):
+        if self.conflicts:
+            log.warning(
+                f"{len(self.conflicts)} page(s) had version conflicts:\n  "
+                + "\n  ".join(f"{title}: {result}" for title, result in self.conflicts)
+            )
+
     def on_page_content(self, html, page, config, files):
         return html
 
+    def __parse_shard(self, shard):
+        try:
+            index, count = (int(x) for x in shard.split("/"))
+        except ValueError:
+            index, count = -1, 0
+
+        if count < 1 or not 0 <= index <= count:
+            raise PluginError(
+                f"Invalid shard '{shard}': expected 'i/N' with 1 <= i <= N,"
+                " or '0/N' to only create the parent pages"
+            )
+
+        if index == 0:
+            log.info(f"Shard 0/{count}: creating parent pages only")
+        else:
+            log.info(f"Shard {index}/{count}: publishing only this shard's pages")
+
+        return (index, count)
+
+    def __git(self, *args, cwd=None):
+        r = subprocess.run(
+            ["git", *args], cwd=cwd, capture_output=True, encoding="utf-8", check=True
+        )
+        return r.stdout
+
+    def __get_changed_files(self, config):
+        # None means publish everything
+        base = self.config["git_diff_base"]
+        marker = self.config["git_diff_marker"]
+
+        if not base and marker and os.path.isfile(marker):
+            with open(marker) as f:
+                base = f.read().strip()
+
+        if not base or not self.enabled:
+            return None
+
+        config_file = config["config_file_path"]
+        docs_dir = config["docs_dir"]
+
+        try:
+            # The nav decides titles and parents, any change to it needs a full publish
+            self.__git(
+                "diff",
+                "--quiet",
+                base,
+                "--",
+                config_file,
+                cwd=os.path.dirname(config_file),
+            )
+
+            # -z keeps non-ASCII paths unquoted so they match src_uri
+            changed = self.__git(
+                "diff", "--name-only", "-z", "--relative", base, "--", ".", cwd=docs_dir
+            ).split("\0")
+            changed += self.__git(
+                "ls-files", "--others", "--exclude-standard", "-z", cwd=docs_dir
+            ).split("\0")
+            changed = [f for f in changed if f]
+        except subprocess.CalledProcessError as e:
+            if e.returncode == 1:
+                log.info(
+                    "mkdocs config changed since the git diff base, publishing all"
+                )
+            else:
+                log.warning(
+                    f"git diff against '{base}' failed, publishing all: {e.stderr}"
+                )
+            return None
+        except OSError as e:
+            log.warning(f"Could not run git, publishing all: {str(e)}")
+            return None
+
+        log.info(f"Publishing only pages affected by {len(changed)} changed file(s)")
+
+        return set(changed)
+
+    def __save_git_diff_marker(self, marker, docs_dir):
+        try:
+            head = self.__git("rev-parse", "HEAD", cwd=docs_dir).strip()
+        except (subprocess.CalledProcessError, OSError) as e:
+            log.warning(f"Could not read the current git commit: {str(e)}")
+            return
+
+        directory = os.path.dirname(marker)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(marker, "w") as f:
+            f.write(head + "\n")
+
+    def __get_section_levels(self, pages):
+        # levels[depth] maps each section title to the title of its parent page
+        levels = []
+
+        for page in pages:
+            titles = [
+                self.__get_section_title(a.__repr__()) for a in reversed(page.ancestors)
+            ]
+            for depth, title in enumerate(titles):
+                if len(levels) <= depth:
+                    levels.append({})
+                levels[depth].setdefault(
+                    title, titles[depth - 1] if depth else self.main_parent
+                )
+
+        return levels
+
+    def __resolve_parent_id(self, page, parent):
+        parent_id = self.parent_page_ids.get(parent)
+
+        if not parent_id:
+            ###############################################
+            log.debug("Creating parent page(s)")
+            ###############################################
+            self.__create_parent_hierarchy(self.__get_section_levels([page]))
+
+            parent_id = self.parent_page_ids.get(parent)
+
+        return parent_id
+
+    def __create_parent_hierarchy(self, levels):
+        main_parent = self.main_parent
+
+        if main_parent not in self.parent_page_ids:
+            main_parent_id, _ = self.find_page_id(main_parent)
+            if not main_parent_id:
+                log.warning("Main parent unknown. Aborting!")
+                return
+            self.parent_page_ids[main_parent] = main_parent_id
+
+        def find_id(title):
+            page_id, _ = self.find_page_id(title)
+            return page_id
+
+        def create(title, parent_title):
+            if self.is_shard_worker:
+                log.warning(
+                    f"Parent '{title}' does not exist. Shard workers do not create"
+                    f" parents, publish with shard 0/{self.shard[1]} first. Skipping..."
+                )
+                return None
+
+            parent_id = self.parent_page_ids.get(parent_title)
+            if not parent_id:
+                log.warning(
+                    f"Parent '{parent_title}' of '{title}' unknown. Skipping..."
+                )
+                return None
+
+            log.debug(
+                f"Trying to Add page '{title}' to parent({parent_title}) ID: {parent_id}"
+            )
+
+            body = PARENT_TEMPLATE.replace("TEMPLATE", title)
+            self.add_page(title, parent_id, body, format="wiki")
+
+            if self.dryrun:
+                return None
+
+            return self.wait_until(lambda: find_id(title))
+
+        # Walk the tree breadth-first: each level only needs the ids of the level
+        # above, so all siblings can be looked up and created concurrently.
+        with ThreadPoolExecutor(max_workers=self.config["max_workers"]) as executor:
+            for depth, sections in enumerate(levels):
+                titles = [t for t in sections if t not in self.parent_page_ids]
+                missing = []
+
+                for title, page_id in zip(titles, executor.map(find_id, titles)):
+                    if page_id:
+                        self.parent_page_ids[title] = page_id
+                    else:
+                        missing.append(title)
+
+                if not missing:
+                    continue
+
+                log.info(f"Creating {len(missing)} parent page(s) at level {depth + 1}")
+
+                parents = [sections[t] for t in missing]
+                for title, page_id in zip(
+                    missing, executor.map(create, missing, parents)
+                ):
+                    if page_id:
+                        self.parent_page_ids[title] = page_id
+
     def __get_page_url(self, section):
         return re.search("url='(.*)'\\)", section).group(1)[:-1] + ".md"
 
@@ -482,6 +910,74 @@ class MkdocsWithConfluence(BasePlugin):
             log.warning(f"Page '{name}' doesn't exist in the mkdocs.yml nav section!")
             return name
 
+    def __read_pages(self, files, config):
+        # Titles missing from the nav come from the meta, the first H1 or the file
+        # name, and skip flags from the meta, so both need the source. Read it now
+        # so links to pages exported later resolve too and parents are only created
+        # for exported pages; mkdocs reads it again when building each page.
+        pages = []
+
+        for f in files.documentation_pages():
+            if f.page is None:
+                continue
+
+            try:
+                if f.page.markdown is None:
+                    f.page.read_source(config)
+                pages.append(f.page)
+            except Exception as e:
+                log.debug(f"WARN({e}): Could not read {f.src_uri}. Proceed..")
+
+        return pages
+
+    def __get_page_fingerprint(self, markdown, page, parents):
+        data = {
+            "version": PLUGIN_VERSION,
+            "config": {k: self.config[k] for k in FINGERPRINT_CONFIG_KEYS},
+            "title": page.title,
+            "meta": page.meta,
+            "ancestors": [a.title for a in page.ancestors] + parents,
+            "links": self.__get_link_titles(markdown, page),
+            "markdown": markdown,
+        }
+
+        return self.__get_text_md5(json.dumps(data, sort_keys=True, default=str))
+
+    def __get_link_titles(self, markdown, page):
+        # Page links are rendered with the target's title, renaming it changes the body
+        titles = {}
+
+        for match in re.finditer(LINK_HREF_RE, markdown, re.M):
+            target = resolve_page_link(
+                page.file.src_uri, match.group(1) or match.group(2)
+            )
+            if target is not None:
+                titles[target] = self.confluence_renderer.page_titles.get(target)
+
+        return titles
+
+    def __load_page_cache(self, cache_file):
+        try:
+            with open(cache_file) as f:
+                page_cache = json.load(f)
+            log.debug(f"Loaded {len(page_cache)} page fingerprints from {cache_file}")
+            return page_cache
+        except (OSError, ValueError) as e:
+            log.debug(f"WARN({e}): No usable page cache in {cache_file}. Proceed..")
+            return {}
+
+    def __save_page_cache(self, cache_file, page_cache):
+        directory = os.path.dirname(cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(cache_file, "w") as f:
+            json.dump(page_cache, f, indent=2, sort_keys=True)
+
+    def __get_source_label(self, src_uri):
+        # Labels cannot hold '/' or '.', so the source path is stored hashed
+        return f"{SOURCE_LABEL_PREFIX}{self.__get_text_md5(src_uri)}"
+
     def __get_text_md5(self, text):
         if text:
             return hashlib.md5(text.encode("utf-8")).hexdigest()
@@ -494,14 +990,18 @@ class MkdocsWithConfluence(BasePlugin):
                 hash_sha1.update(chunk)
         return hash_sha1.hexdigest()
 
-    def add_or_update_attachment(self, page_name, attachment_name, attachment_path):
+    def add_or_update_attachment(
+        self, page_name, attachment_name, attachment_path, content=None, file_hash=None
+    ):
+        # content/file_hash: upload in-memory bytes instead of reading attachment_path
         log.debug(
             f"Add or Update attachment[{attachment_name}] to page[{page_name}] using file[{attachment_path}]"
         )
 
         page_id, _ = self.find_page_id(page_name)
         if page_id:
-            file_hash = self.__get_file_sha1(attachment_path)
+            if file_hash is None:
+                file_hash = self.__get_file_sha1(attachment_path)
             attachment_message = f"MKDocsWithConfluence [v{file_hash}]"
             existing_attachment = self.get_attachment(page_id, attachment_name)
             if existing_attachment:
@@ -520,10 +1020,15 @@ class MkdocsWithConfluence(BasePlugin):
                         attachment_path,
                         existing_attachment,
                         attachment_message,
+                        content,
                     )
             else:
                 return self.create_attachment(
-                    page_id, attachment_name, attachment_path, attachment_message
+                    page_id,
+                    attachment_name,
+                    attachment_path,
+                    attachment_message,
+                    content,
                 )
         else:
             log.debug("ERR: page does not exists")
@@ -535,53 +1040,37 @@ class MkdocsWithConfluence(BasePlugin):
 
         name = os.path.basename(attachment_name)
 
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "/"
-            + page_id
-            + "/child/attachment"
-        )
-        headers = {"X-Atlassian-Token": "no-check"}
-
-        r = self.session.get(
-            url, headers=headers, params={"filename": name, "expand": "version"}
-        )
-        r.raise_for_status()
-        with nostdout():
-            response_json = r.json()
-        if response_json["size"]:
-            return response_json["results"][0]
+        return self.api.get_attachment(page_id, name)
 
     def update_attachment(
-        self, page_id, attachment_name, attachment_path, existing_attachment, message
+        self,
+        page_id,
+        attachment_name,
+        attachment_path,
+        existing_attachment,
+        message,
+        content=None,
     ):
         log.debug(
             f"Update attachment[{attachment_name}] to page[{page_id}] using file[{attachment_path}]"
         )
 
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "/"
-            + page_id
-            + "/child/attachment/"
-            + existing_attachment["id"]
-            + "/data"
-        )
-        headers = {"X-Atlassian-Token": "no-check"}
-
         filename = os.path.basename(attachment_name)
 
         content_type, encoding = mimetypes.guess_type(attachment_path)
         if content_type is None:
             content_type = "multipart/form-data"
-        files = {
-            "file": (filename, open(Path(attachment_path), "rb"), content_type),
-            "comment": message,
-        }
 
         if not self.dryrun:
-            r = self.session.post(url, headers=headers, files=files)
-            r.raise_for_status()
+            with self.__open_attachment(attachment_path, content) as data:
+                r = self.api.update_attachment(
+                    page_id,
+                    existing_attachment["id"],
+                    filename,
+                    data,
+                    content_type,
+                    message,
+                )
 
             if r.status_code == 200:
                 log.debug("OK!")
@@ -592,32 +1081,25 @@ class MkdocsWithConfluence(BasePlugin):
 
         return True
 
-    def create_attachment(self, page_id, attachment_name, attachment_path, message):
+    def create_attachment(
+        self, page_id, attachment_name, attachment_path, message, content=None
+    ):
         log.debug(
             f"Create attachment[{attachment_name}] to page[{page_id}] using Ffile[{attachment_path}]"
         )
 
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "/"
-            + page_id
-            + "/child/attachment"
-        )
-        headers = {"X-Atlassian-Token": "no-check"}
-
         filename = os.path.basename(attachment_name)
 
         # determine content-type
         content_type, encoding = mimetypes.guess_type(attachment_path)
         if content_type is None:
             content_type = "multipart/form-data"
-        files = {
-            "file": (filename, open(attachment_path, "rb"), content_type),
-            "comment": message,
-        }
+
         if not self.dryrun:
-            r = self.session.post(url, headers=headers, files=files)
-            r.raise_for_status()
+            with self.__open_attachment(attachment_path, content) as data:
+                r = self.api.create_attachment(
+                    page_id, filename, data, content_type, message
+                )
 
             if r.status_code == 200:
                 log.debug("OK!")
@@ -628,71 +1110,45 @@ class MkdocsWithConfluence(BasePlugin):
 
         return True
 
+    @contextlib.contextmanager
+    def __open_attachment(self, attachment_path, content=None):
+        if content is not None:
+            yield content
+        else:
+            with open(Path(attachment_path), "rb") as f:
+                yield f
+
     def find_page_id(self, page_name):
         log.debug(f"Find page_id for page[{page_name}]")
 
-        name_confl = page_name.replace(" ", "+")
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "?title="
-            + name_confl
-            + "&spaceKey="
-            + self.config["space"]
-            + "&expand=history,metadata.labels"
-        )
-
-        r = self.session.get(url)
-        r.raise_for_status()
+        page = self.api.find_page(page_name)
 
-        with nostdout():
-            response_json = r.json()
+        if page:
+            log.debug(f"ID: {page['id']}")
 
-        if response_json["results"]:
-            log.debug(f"ID: {response_json['results'][0]['id']}")
-
-            page_result = response_json["results"][0]
-
-            id = page_result["id"]
-            hash = [
-                x.get("name")
-                for x in page_result["metadata"]["labels"]["results"]
-                if x.get("prefix") == "global"
-                and x.get("name").startswith(HASH_LABEL_PREFIX)
-            ]
-
-            return (id, hash[0].replace(HASH_LABEL_PREFIX, "") if hash else None)
+            return (page["id"], page["hash"])
         else:
             log.debug("ERR: page does not exist")
 
             return (None, None)
 
-    def add_page(self, page_name, parent_page_id, page_content, format="storage"):
+    def add_page(
+        self,
+        page_name,
+        parent_page_id,
+        page_content,
+        format="storage",
+        source_label=None,
+    ):
         log.debug(f"Add page[{page_name}] to parent page[{parent_page_id}]")
 
         new_md5 = self.__get_text_md5(page_content.strip())
-
-        url = CONTENT_URL_FORMAT.format(base_url=self.config["host_url"]) + "/"
-
-        headers = {"Content-Type": "application/json"}
-        space = self.config["space"]
-        hash_label = f"{HASH_LABEL_PREFIX}{new_md5}"
-        data = {
-            "type": "page",
-            "title": page_name,
-            "space": {"key": space},
-            "ancestors": [{"id": parent_page_id}],
-            "body": {
-                "storage": {
-                    "value": page_content,
-                    "representation": format,
-                }
-            },
-            "metadata": {"labels": [{"prefix": "global", "name": hash_label}]},
-        }
+        labels = [source_label] if source_label else []
 
         if not self.dryrun:
-            r = self.session.post(url, json=data, headers=headers)
-            r.raise_for_status()
+            r = self.api.create_page(
+                page_name, parent_page_id, page_content, format, new_md5, labels
+            )
 
             if r.status_code == 200:
                 log.debug("OK!")
@@ -705,90 +1161,107 @@ class MkdocsWithConfluence(BasePlugin):
 
         return True
 
-    def update_page(self, page_name, page_content, format="storage"):
+    def update_page(
+        self,
+        page_name,
+        page_content,
+        format="storage",
+        page=None,
+        parent_id=None,
+        source_label=None,
+    ):
+        # page: already looked up page (e.g. by source path), parent_id: move target
         log.debug(f"Update page[{page_name}]")
 
-        page_id, current_md5 = self.find_page_id(page_name)
+        if page is None:
+            page = self.api.find_page(page_name)
 
-        if not page_id:
+        if not page:
             log.debug(f"ERR: page[{page_name}] not found")
             return False
 
         new_md5 = self.__get_text_md5(page_content.strip())
+        labels = [source_label] if source_label else []
 
-        if page_id:
-            if current_md5 == new_md5:
-                log.debug("SKIP!")
-
-                return True
+        if (
+            page["title"] == page_name
+            and not parent_id
+            and self.api.get_page_hash(page) == new_md5
+        ):
+            if source_label and source_label not in (page.get("labels") or []):
+                log.debug(f"Tagging page[{page_name}] with {source_label}")
 
-            page_version = self.find_page_version(page_name)
-            page_version = page_version + 1
-            url = (
-                CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-                + "/"
-                + page_id
-            )
+                if not self.dryrun:
+                    self.api.add_labels(page["id"], labels)
 
-            headers = {"Content-Type": "application/json"}
-            space = self.config["space"]
-            hash_label = f"{HASH_LABEL_PREFIX}{new_md5}"
-            data = {
-                "id": page_id,
-                "title": page_name,
-                "type": "page",
-                "space": {"key": space},
-                "body": {
-                    "storage": {
-                        "value": page_content,
-                        "representation": format,
-                    }
-                },
-                "version": {"number": page_version},
-                "metadata": {"labels": [{"prefix": "global", "name": hash_label}]},
-            }
+            log.debug("SKIP!")
 
-            if not self.dryrun:
-                r = self.session.put(url, json=data, headers=headers)
-                r.raise_for_status()
+            return True
 
-                if r.status_code == 200:
-                    log.debug("OK!")
+        if self.dryrun:
+            return True
 
-                    self.wait()
-                else:
-                    log.debug("ERR!")
+        for attempt in range(self.config["conflict_retries"] + 1):
+            try:
+                r = self.api.update_page(
+                    page["id"],
+                    page_name,
+                    page_content,
+                    format,
+                    page["version"] + 1,
+                    new_md5,
+                    labels,
+                    parent_id,
+                )
+                break
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 409:
+                    raise
+
+            ###############################################
+            log.debug(f"Version conflict on page[{page_name}], refetching")
+            ###############################################
+            page = self.api.get_page(page["id"])
+
+            # A concurrent publish only makes this update redundant if it also
+            # applied the move
+            if (
+                page["title"] == page_name
+                and (not parent_id or page["parent_id"] == parent_id)
+                and self.api.get_page_hash(page) == new_md5
+            ):
+                log.info(f"Page '{page_name}' was already updated concurrently")
+                self.conflicts.append((page_name, "already up to date"))
+                return True
+        else:
+            log.warning(
+                f"Page '{page_name}' is still in conflict after "
+                f"{self.config['conflict_retries']} retries. Skipping..."
+            )
+            self.conflicts.append((page_name, "not updated"))
+            return False
 
-                    return False
+        if attempt:
+            self.conflicts.append((page_name, f"updated after {attempt} retries"))
 
-            return True
+        if r.status_code == 200:
+            log.debug("OK!")
 
+            self.wait()
         else:
-            log.debug("Page does not exist yet!")
+            log.debug("ERR!")
 
             return False
 
+        return True
+
     def find_page_version(self, page_name):
         log.debug(f"Find version for page[{page_name}]")
 
-        name_confl = page_name.replace(" ", "+")
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "?title="
-            + name_confl
-            + "&spaceKey="
-            + self.config["space"]
-            + "&expand=version"
-        )
-
-        r = self.session.get(url)
-        r.raise_for_status()
-
-        with nostdout():
-            response_json = r.json()
+        page = self.api.find_page(page_name)
 
-        if response_json["results"] is not None:
-            version = response_json["results"][0]["version"]["number"]
+        if page is not None:
+            version = page["version"]
 
             log.debug(f"Founfd version[{version}] for page[{page_name}]")
 
@@ -802,50 +1275,18 @@ class MkdocsWithConfluence(BasePlugin):
         log.debug(f" * Find Parent of page with name={page_name}")
 
         idp, _ = self.find_page_id(page_name)
-        url = (
-            CONTENT_URL_FORMAT.format(base_url=self.config["host_url"])
-            + "/"
-            + idp
-            + "?expand=ancestors"
-        )
-
-        r = self.session.get(url)
-        r.raise_for_status()
-
-        with nostdout():
-            response_json = r.json()
+        parent_name = self.api.get_parent_title(idp)
 
-        if response_json:
-            return response_json["ancestors"][-1]["title"]
-        else:
+        if parent_name is None:
             log.debug("Page does not have parent")
 
-            return None
+        return parent_name
 
     def convert_page(self, body, from_type="wiki", to_type="storage"):
         log.debug(f"Converting page from {from_type} to {to_type}")
 
         try:
-            url = CONVERT_URL_FORMAT.format(
-                base_url=self.config["host_url"], to=to_type
-            )
-
-            headers = {"Accept": "application/json", "Content-Type": "application/json"}
-
-            data = {"value": body, "representation": from_type}
-
-            r = self.session.post(url, json=data, headers=headers)
-            r.raise_for_status()
-            if r.status_code == 200:
-                log.debug("OK!")
-
-                response_json = r.json()
-                return response_json["value"]
-            else:
-                log.debug("ERR!")
-
-            return None
-
+            return self.api.convert(body, from_type, to_type)
         except Exception as e:
             log.debug(f"WARN(({e}): Error converting page")
 
@@ -870,4 +1311,5 @@ class MkdocsWithConfluence(BasePlugin):
         if not interval:
             interval = self.config["sleep_time"]
 
-        time.sleep(interval)
+        with self.tracer.span("wait", cat="sleep", seconds=interval):
+            time.sleep(interval)
@@ -0,0 +1,67 @@
+import html
+import posixpath
+from urllib.parse import unquote, urlparse
+
+from md2cf.confluence_renderer import ConfluenceRenderer
+
+PAGE_LINK_TEMPLATE = (
+    '<ac:link{anchor}><ri:page ri:space-key="{space}" ri:content-title="{title}" />'
+    "<ac:link-body>{text}</ac:link-body></ac:link>"
+)
+
+
+def resolve_page_link(src_uri, href):
+    """Returns the source path a relative .md href on page src_uri points to.
+
+    None when href is not a relative link to a markdown page.
+    """
+    url = urlparse(href)
+    if url.scheme or url.netloc or not url.path.endswith(".md"):
+        return None
+
+    return posixpath.normpath(
+        posixpath.join(posixpath.dirname(src_uri), unquote(url.path))
+    )
+
+
+class PageLinkRenderer(ConfluenceRenderer):
+    """ConfluenceRenderer that renders links between mkdocs pages as page links.
+
+    ``page_titles`` maps source paths to page titles and ``src_uri`` is the page
+    being rendered. The titles it linked to and the hrefs it could not resolve
+    are collected in ``page_links`` and ``unresolved_links`` until ``reinit``.
+    """
+
+    def __init__(self, space=None, **kwargs):
+        super().__init__(**kwargs)
+        self.space = space
+        self.page_titles = {}
+        self.src_uri = None
+        self.page_links = []
+        self.unresolved_links = []
+
+    def reinit(self, src_uri=None):
+        super().reinit()
+        self.src_uri = src_uri
+        self.page_links = []
+        self.unresolved_links = []
+
+    def link(self, link, title, text):
+        target = resolve_page_link(self.src_uri or "", link)
+        if target is None:
+            return super().link(link, title, text)
+
+        page_title = self.page_titles.get(target)
+        if page_title is None:
+            self.unresolved_links.append(link)
+            return super().link(link, title, text)
+
+        self.page_links.append(page_title)
+        anchor = urlparse(link).fragment
+
+        return PAGE_LINK_TEMPLATE.format(
+            anchor=f' ac:anchor="{html.escape(anchor)}"' if anchor else "",
+            space=html.escape(self.space or ""),
+            title=html.escape(page_title),
+            text=text or html.escape(page_title),
+        )
@@ -0,0 +1,87 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+
+class Tracer(object):
+    """Collects spans as Chrome trace-event JSON (loadable in Perfetto/speedscope)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def _now(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, cat="plugin", **args):
+        if not self.enabled:
+            yield
+            return
+
+        # Nested spans (e.g. HTTP calls) inherit the page they were made for
+        outer_page = getattr(self._local, "page", None)
+        if args.get("page") is None:
+            args["page"] = outer_page
+        self._local.page = args["page"]
+
+        start = self._now()
+        try:
+            yield
+        finally:
+            self._local.page = outer_page
+            event = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": start,
+                "dur": self._now() - start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {k: v for k, v in args.items() if v is not None},
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def dump(self, path):
+        if not self.enabled:
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            data = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+class TracedSession(requests.Session):
+    """requests.Session that records every HTTP call as a span on the given tracer."""
+
+    def __init__(self, tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    def request(self, method, url, *args, **kwargs):
+        if not self.tracer.enabled:
+            return super().request(method, url, *args, **kwargs)
+
+        endpoint = urlparse(url).path
+        with self.tracer.span(f"{method} {endpoint}", cat="http", url=url):
+            return super().request(method, url, *args, **kwargs)
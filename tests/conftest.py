@@ -0,0 +1,65 @@
+import pytest
+import requests
+import yaml
+from mkdocs.commands.build import build
+from mkdocs.config import load_config
+
+from mkdocs_with_confluence.api import API_BACKENDS
+from mock_confluence import MockConfluence
+
+
+@pytest.fixture
+def confluence():
+    mock = MockConfluence().start()
+    mock.root_id = mock.add_page("Root")
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture(params=sorted(API_BACKENDS))
+def api_version(request):
+    return request.param
+
+
+@pytest.fixture
+def api(confluence, api_version):
+    return API_BACKENDS[api_version](requests.Session(), confluence.url, "SP")
+
+
+@pytest.fixture
+def site(tmp_path, confluence):
+    """Writes a mkdocs project into tmp_path and returns a callable that builds it."""
+
+    def write(files, nav=None, **plugin_config):
+        for path, content in files.items():
+            (tmp_path / "docs" / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / "docs" / path).write_text(content, encoding="utf-8")
+
+        plugin = {
+            "host_url": confluence.url,
+            "space": "SP",
+            "parent_page_name": "Root",
+            "username": "user",
+            "password": "secret",
+            "sleep_time": 0.001,
+            "timeout": 1.0,
+        }
+        plugin.update(plugin_config)
+        config = {
+            "site_name": "Test",
+            "plugins": [{"mkdocs-with-confluence": plugin}],
+        }
+        if nav is not None:
+            config["nav"] = nav
+
+        config_file = tmp_path / "mkdocs.yml"
+        config_file.write_text(yaml.safe_dump(config), encoding="utf-8")
+
+        def run():
+            confluence.requests.clear()
+            build(load_config(str(config_file)))
+            return confluence.requests
+
+        return run
+
+    return write
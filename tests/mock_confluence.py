@@ -0,0 +1,336 @@
+"""In-memory stand-in for the Confluence REST v1 and v2 endpoints used by the plugin."""
+
+import itertools
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+V1_PREFIX = "/wiki/rest/api"
+V2_PREFIX = "/wiki/api/v2"
+SPACE_ID = "77"
+
+# Small page sizes so pagination is exercised with a handful of pages
+V1_PAGE_SIZE = 2
+V2_PAGE_SIZE = 2
+
+
+class MockConfluence(object):
+    def __init__(self, space="SP"):
+        self.space = space
+        self.pages = {}
+        self.attachments = {}
+        self.requests = []
+        # page id -> number of concurrent edits to simulate on the next updates
+        self.conflicts = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1000)
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        mock = self
+
+        class Handler(RequestHandler):
+            confluence = mock
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_page(self, title, parent_id=None, body="", labels=()):
+        page_id = str(next(self._ids))
+        self.pages[page_id] = {
+            "id": page_id,
+            "title": title,
+            "parent_id": parent_id,
+            "body": body,
+            "version": 1,
+            "labels": list(labels),
+            "properties": {},
+        }
+        return page_id
+
+    def find(self, title):
+        for page in self.pages.values():
+            if page["title"] == title:
+                return page
+
+    def writes(self):
+        return [r for r in self.requests if not r.startswith("GET ")]
+
+    def ancestors(self, page):
+        ancestors = []
+        parent_id = page["parent_id"]
+        while parent_id:
+            parent = self.pages[parent_id]
+            ancestors.insert(0, {"id": parent["id"], "title": parent["title"]})
+            parent_id = parent["parent_id"]
+        return ancestors
+
+    def v1_page(self, page):
+        return {
+            "id": page["id"],
+            "type": "page",
+            "title": page["title"],
+            "version": {"number": page["version"]},
+            "metadata": {
+                "labels": {
+                    "results": [
+                        {"prefix": "global", "name": name} for name in page["labels"]
+                    ]
+                }
+            },
+            "ancestors": self.ancestors(page),
+        }
+
+    def v2_page(self, page):
+        return {
+            "id": page["id"],
+            "title": page["title"],
+            "parentId": page["parent_id"],
+            "version": {"number": page["version"]},
+        }
+
+    def check_version(self, page, version):
+        if self.conflicts.get(page["id"]):
+            self.conflicts[page["id"]] -= 1
+            page["version"] += 1
+
+        return version == page["version"] + 1
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    confluence = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        with self.confluence.lock:
+            self.confluence.requests.append(f"{method} {url.path}")
+
+            if url.path.startswith(V2_PREFIX):
+                route = self.route_v2
+                path = url.path[len(V2_PREFIX) :]
+            elif url.path.startswith(V1_PREFIX):
+                route = self.route_v1
+                path = url.path[len(V1_PREFIX) :]
+            else:
+                route = self.route_unknown
+                path = url.path
+
+            status, data = route(method, path.rstrip("/"), query, raw)
+
+        self.send(status, data)
+
+    def route_v1(self, method, path, query, raw):
+        c = self.confluence
+
+        if path.startswith("/contentbody/convert/"):
+            value = json.loads(raw)["value"]
+            return 200, {"value": f"<converted>{value}</converted>"}
+
+        if path == "/content/search":
+            cql = query["cql"]
+            if "label in" in cql:
+                labels = set(re.findall(r'"([^"]*)"', cql.split("label in")[1]))
+                results = [p for p in c.pages.values() if labels & set(p["labels"])]
+            else:
+                titles = re.findall(r'"((?:[^"\\]|\\.)*)"', cql.split("title in")[1])
+                titles = [t.replace('\\"', '"').replace("\\\\", "\\") for t in titles]
+                results = [p for p in c.pages.values() if p["title"] in titles]
+            results = [c.v1_page(p) for p in results]
+            start = int(query.get("start", 0))
+            # Like Confluence, next links are relative to the base, not the host
+            links = {"base": f"{c.url}/wiki"}
+            if len(results) > start + V1_PAGE_SIZE:
+                next_query = urlencode({**query, "start": start + V1_PAGE_SIZE})
+                links["next"] = f"/rest/api/content/search?{next_query}"
+            results = results[start : start + V1_PAGE_SIZE]
+            return 200, {"results": results, "size": len(results), "_links": links}
+
+        if path == "/content" and method == "GET":
+            results = [c.v1_page(p) for p in c.pages.values()]
+            results = [p for p in results if p["title"] == query.get("title")]
+            return 200, {"results": results, "size": len(results)}
+
+        if path == "/content" and method == "POST":
+            data = json.loads(raw)
+            if c.find(data["title"]):
+                return 400, {"message": "A page with this title already exists"}
+            page_id = c.add_page(
+                data["title"],
+                data["ancestors"][0]["id"],
+                data["body"]["storage"]["value"],
+                [label["name"] for label in data["metadata"]["labels"]],
+            )
+            return 200, c.v1_page(c.pages[page_id])
+
+        match = re.match(r"/content/(\d+)/label$", path)
+        if match:
+            page = c.pages[match.group(1)]
+            for label in json.loads(raw):
+                if label["name"] not in page["labels"]:
+                    page["labels"].append(label["name"])
+            return 200, {}
+
+        match = re.match(r"/content/(\d+)$", path)
+        if match and method == "GET":
+            return 200, c.v1_page(c.pages[match.group(1)])
+
+        if match and method == "PUT":
+            page = c.pages[match.group(1)]
+            data = json.loads(raw)
+            if not c.check_version(page, data["version"]["number"]):
+                return 409, {"message": "Version must be incremented on update"}
+            page["version"] += 1
+            page["title"] = data["title"]
+            page["body"] = data["body"]["storage"]["value"]
+            page["labels"] = [label["name"] for label in data["metadata"]["labels"]]
+            if "ancestors" in data:
+                page["parent_id"] = data["ancestors"][0]["id"]
+            return 200, c.v1_page(page)
+
+        match = re.match(r"/content/(\d+)/child/attachment(?:/(\w+)/data)?$", path)
+        if match:
+            attachments = c.attachments.setdefault(match.group(1), [])
+
+            if method == "GET":
+                results = [
+                    a
+                    for a in attachments
+                    if a["title"] == query.get("filename", a["title"])
+                ]
+                return 200, {"results": results, "size": len(results)}
+
+            message = re.search(rb'name="comment"\r\n\r\n([^\r]*)', raw).group(1)
+            filename = re.search(rb'name="file"; filename="([^"]*)"', raw).group(1)
+            attachment = {
+                "id": match.group(2) or f"att{next(c._ids)}",
+                "title": filename.decode("utf-8"),
+                "version": {"message": message.decode("utf-8")},
+            }
+            attachments[:] = [a for a in attachments if a["id"] != attachment["id"]]
+            attachments.append(attachment)
+            return 200, {"results": [attachment]}
+
+        return 404, {"message": f"No route for {method} {path}"}
+
+    def route_unknown(self, method, path, query, raw):
+        return 404, {"message": f"No route for {method} {path}"}
+
+    def route_v2(self, method, path, query, raw):
+        c = self.confluence
+
+        if path == "/spaces":
+            return 200, {"results": [{"id": SPACE_ID, "key": query["keys"]}]}
+
+        if path == "/pages" and method == "GET":
+            results = [
+                c.v2_page(p)
+                for p in c.pages.values()
+                if p["title"] == query.get("title", p["title"])
+            ]
+            start = int(query.get("cursor", 0))
+            links = {}
+            if len(results) > start + V2_PAGE_SIZE:
+                links["next"] = f"{V2_PREFIX}/pages?cursor={start + V2_PAGE_SIZE}"
+            return 200, {
+                "results": results[start : start + V2_PAGE_SIZE],
+                "_links": links,
+            }
+
+        if path == "/pages" and method == "POST":
+            data = json.loads(raw)
+            if c.find(data["title"]):
+                return 400, {"message": "A page with this title already exists"}
+            page_id = c.add_page(data["title"], data["parentId"], data["body"]["value"])
+            return 200, c.v2_page(c.pages[page_id])
+
+        match = re.match(r"/pages/(\d+)$", path)
+        if match and method == "GET":
+            return 200, c.v2_page(c.pages[match.group(1)])
+
+        if match and method == "PUT":
+            page = c.pages[match.group(1)]
+            data = json.loads(raw)
+            if not c.check_version(page, data["version"]["number"]):
+                return 409, {"message": "Version must be incremented on update"}
+            page["version"] += 1
+            page["title"] = data["title"]
+            page["body"] = data["body"]["value"]
+            if data.get("parentId"):
+                page["parent_id"] = data["parentId"]
+            return 200, c.v2_page(page)
+
+        match = re.match(r"/pages/(\d+)/properties(?:/([\w-]+))?$", path)
+        if match:
+            properties = c.pages[match.group(1)]["properties"]
+
+            if method == "GET":
+                results = [p for k, p in properties.items() if k == query.get("key", k)]
+                return 200, {"results": results}
+
+            data = json.loads(raw)
+            existing = properties.get(data["key"])
+            if method == "POST" and existing:
+                return 409, {"message": "Property already exists"}
+            if method == "PUT" and (
+                existing is None
+                or data["version"]["number"] != existing["version"]["number"] + 1
+            ):
+                return 409, {"message": "Property version conflict"}
+
+            properties[data["key"]] = {
+                "id": f"prop-{data['key']}",
+                "key": data["key"],
+                "value": data["value"],
+                "version": {
+                    "number": existing["version"]["number"] + 1 if existing else 1
+                },
+            }
+            return 200, properties[data["key"]]
+
+        match = re.match(r"/pages/(\d+)/attachments$", path)
+        if match:
+            results = [
+                a
+                for a in c.attachments.get(match.group(1), [])
+                if a["title"] == query.get("filename", a["title"])
+            ]
+            return 200, {"results": results}
+
+        return 404, {"message": f"No route for {method} {path}"}
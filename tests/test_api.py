@@ -0,0 +1,139 @@
+import pytest
+import requests
+
+
+def create(api, confluence, title, hash="h1", labels=()):
+    api.create_page(title, confluence.root_id, "<p>body</p>", "storage", hash, labels)
+    return confluence.find(title)["id"]
+
+
+def test_find_page(api, confluence):
+    page_id = create(api, confluence, "Page")
+
+    page = api.find_page("Page")
+
+    assert page["id"] == page_id
+    assert page["title"] == "Page"
+    assert page["version"] == 1
+    assert page["parent_id"] == confluence.root_id
+    assert api.get_page_hash(page) == "h1"
+
+
+def test_find_missing_page(api):
+    assert api.find_page("Missing") is None
+
+
+def test_find_pages_follows_pagination(api, confluence):
+    for i in range(5):
+        create(api, confluence, f"Page {i}")
+
+    pages = api.find_pages(["Page 0", "Page 4", "Missing"])
+
+    assert sorted(pages) == ["Page 0", "Page 4"]
+
+
+def test_find_pages_escapes_quotes(api, confluence):
+    create(api, confluence, 'Say "hi"')
+
+    assert list(api.find_pages(['Say "hi"'])) == ['Say "hi"']
+
+
+def test_find_pages_by_label(api, confluence):
+    page_id = create(api, confluence, "Page", labels=["cicd_src_a"])
+    create(api, confluence, "Other", labels=["cicd_src_b"])
+
+    pages = api.find_pages_by_label(["cicd_src_a", "cicd_src_c"])
+
+    assert list(pages) == ["cicd_src_a"]
+    assert pages["cicd_src_a"]["id"] == page_id
+    assert pages["cicd_src_a"]["parent_id"] == confluence.root_id
+    assert api.get_page_hash(pages["cicd_src_a"]) == "h1"
+
+
+def test_find_pages_by_label_follows_pagination(api, confluence):
+    for i in range(5):
+        create(api, confluence, f"Page {i}", labels=[f"cicd_src_{i}"])
+
+    pages = api.find_pages_by_label([f"cicd_src_{i}" for i in range(5)])
+
+    assert sorted(p["title"] for p in pages.values()) == [f"Page {i}" for i in range(5)]
+
+
+def test_update_page(api, confluence):
+    page_id = create(api, confluence, "Page", labels=["cicd_src_a"])
+    parent_id = confluence.add_page("Parent", confluence.root_id)
+
+    api.update_page(
+        page_id, "Renamed", "<p>new</p>", "storage", 2, "h2", ["cicd_src_a"], parent_id
+    )
+
+    page = api.get_page(page_id)
+    assert page["title"] == "Renamed"
+    assert page["version"] == 2
+    assert page["parent_id"] == parent_id
+    assert api.get_page_hash(page) == "h2"
+    assert "cicd_src_a" in confluence.pages[page_id]["labels"]
+
+
+def test_update_page_twice_keeps_one_hash(api, confluence):
+    page_id = create(api, confluence, "Page")
+
+    api.update_page(page_id, "Page", "<p>2</p>", "storage", 2, "h2")
+    api.update_page(page_id, "Page", "<p>3</p>", "storage", 3, "h3")
+
+    assert api.get_page_hash(api.get_page(page_id)) == "h3"
+
+
+def test_update_page_version_conflict(api, confluence):
+    page_id = create(api, confluence, "Page")
+    confluence.conflicts[page_id] = 1
+
+    with pytest.raises(requests.HTTPError) as e:
+        api.update_page(page_id, "Page", "<p>new</p>", "storage", 2, "h2")
+
+    assert e.value.response.status_code == 409
+    assert api.get_page(page_id)["version"] == 2
+
+
+def test_add_labels(api, confluence):
+    page_id = create(api, confluence, "Page")
+
+    api.add_labels(page_id, ["cicd_src_a"])
+
+    assert "cicd_src_a" in confluence.pages[page_id]["labels"]
+
+
+def test_get_parent_title(api, confluence):
+    page_id = create(api, confluence, "Page")
+
+    assert api.get_parent_title(page_id) == "Root"
+    assert api.get_parent_title(confluence.root_id) is None
+
+
+def test_attachments(api, confluence):
+    page_id = create(api, confluence, "Page")
+
+    assert api.get_attachment(page_id, "a.txt") is None
+
+    api.create_attachment(page_id, "a.txt", b"one", "text/plain", "[v1]")
+    attachment = api.get_attachment(page_id, "a.txt")
+    assert attachment["version"]["message"] == "[v1]"
+
+    api.update_attachment(
+        page_id, attachment["id"], "a.txt", b"two", "text/plain", "[v2]"
+    )
+    assert api.get_attachment(page_id, "a.txt")["version"]["message"] == "[v2]"
+
+
+def test_convert(api):
+    assert api.convert("{toc}", "wiki", "storage") == "<converted>{toc}</converted>"
+
+
+def test_lookups_do_not_fetch_hash(api, confluence):
+    create(api, confluence, "Page", labels=["cicd_src_a"])
+    confluence.requests.clear()
+
+    api.find_page("Page")
+    api.find_pages_by_label(["cicd_src_a"])
+
+    assert not [r for r in confluence.requests if "/properties" in r]
@@ -0,0 +1,271 @@
+import logging
+import shutil
+import subprocess
+
+import pytest
+
+NAV = [
+    {"Home": "index.md"},
+    {
+        "Guide": [
+            {"Intro": "guide/intro.md"},
+            {"Deep": [{"Inner": "guide/deep/inner.md"}]},
+        ]
+    },
+]
+DOCS = {
+    "index.md": "# Home\n\nWelcome\n",
+    "guide/intro.md": "# Intro\n\n```mermaid\ngraph TD; A-->B\n```\n",
+    "guide/deep/inner.md": "# Inner\n\nDeep down\n",
+}
+
+
+def parent_title(confluence, title):
+    return confluence.pages[confluence.find(title)["parent_id"]]["title"]
+
+
+@pytest.fixture
+def publish(site, api_version):
+    def publish(files=DOCS, nav=NAV, **plugin_config):
+        return site(files, nav, api_version=api_version, **plugin_config)
+
+    return publish
+
+
+def test_publish_creates_hierarchy(publish, confluence):
+    publish()()
+
+    assert parent_title(confluence, "Home") == "Root"
+    assert parent_title(confluence, "Guide") == "Root"
+    assert parent_title(confluence, "Intro") == "Guide"
+    assert parent_title(confluence, "Deep") == "Guide"
+    assert parent_title(confluence, "Inner") == "Deep"
+
+    intro = confluence.find("Intro")
+    assert "<converted>" in intro["body"]
+    assert [a["title"] for a in confluence.attachments[intro["id"]]] == [
+        "mermaid-1cad35d4b3b9f624f82dbf237daaf188-1.txt"
+    ]
+
+
+def test_skipped_sections_are_not_created(publish, confluence):
+    skip = "---\nmkdocs_with_confluence_skip: true\n---\n\n"
+    publish(
+        {
+            **DOCS,
+            "guide/intro.md": skip + DOCS["guide/intro.md"],
+            "guide/deep/inner.md": skip + DOCS["guide/deep/inner.md"],
+        }
+    )()
+
+    assert parent_title(confluence, "Home") == "Root"
+    assert [p["title"] for p in confluence.pages.values()] == ["Root", "Home"]
+
+
+def test_republish_unchanged_makes_no_writes(publish, confluence):
+    run = publish()
+    run()
+
+    run()
+
+    assert [r for r in confluence.writes() if "/convert/" not in r] == []
+
+
+def test_republish_updates_changed_page(publish, confluence):
+    publish()()
+
+    publish({**DOCS, "guide/deep/inner.md": "# Inner\n\nDeeper\n"})()
+
+    assert confluence.find("Inner")["version"] == 2
+    assert "Deeper" in confluence.find("Inner")["body"]
+    assert confluence.find("Home")["version"] == 1
+
+
+def test_rename_updates_in_place(publish, confluence):
+    publish()()
+    page_id = confluence.find("Inner")["id"]
+
+    publish(
+        nav=[
+            NAV[0],
+            {
+                "Guide": [
+                    {"Intro": "guide/intro.md"},
+                    {"Renamed": "guide/deep/inner.md"},
+                ]
+            },
+        ]
+    )()
+
+    assert confluence.find("Inner") is None
+    assert confluence.find("Renamed")["id"] == page_id
+    assert parent_title(confluence, "Renamed") == "Guide"
+
+
+def test_version_conflict_is_retried(publish, confluence):
+    publish()()
+    confluence.conflicts[confluence.find("Home")["id"]] = 2
+
+    publish({**DOCS, "index.md": "# Home\n\nChanged\n"})()
+
+    assert "Changed" in confluence.find("Home")["body"]
+
+
+def test_version_conflict_during_move(publish, confluence):
+    publish()()
+    confluence.conflicts[confluence.find("Inner")["id"]] = 1
+
+    publish(
+        nav=[
+            NAV[0],
+            {"Guide": [{"Intro": "guide/intro.md"}]},
+            {"Other": [{"Inner": "guide/deep/inner.md"}]},
+        ]
+    )()
+
+    assert parent_title(confluence, "Inner") == "Other"
+    assert confluence.find("Inner")["version"] == 3
+
+
+def test_links_between_pages(publish, confluence):
+    docs = {
+        **DOCS,
+        "index.md": "# Home\n\n"
+        + "\n".join(f"- [{i}](guide/intro.md#s{i})" for i in range(11))
+        + "\n\n```mermaid\ngraph TD; A-->B\n```\n\n"
+        + "```md\n[code](guide/intro.md)\n```\n\n[gone](gone.md)\n",
+    }
+
+    publish(docs)()
+
+    body = confluence.find("Home")["body"]
+    for i in range(11):
+        assert (
+            f'<ac:link ac:anchor="s{i}"><ri:page ri:space-key="SP" '
+            f'ri:content-title="Intro" /><ac:link-body>{i}</ac:link-body>'
+        ) in body
+    assert body.count("<ac:link ") == 11
+    assert "<converted>" in body
+    assert "<![CDATA[[code](guide/intro.md)]]>" in body
+    assert '<a href="gone.md">gone</a>' in body
+
+
+def test_links_to_pages_without_nav_title(publish, confluence):
+    docs = {
+        "index.md": "# Start\n\n[a](sec/a.md)\n",
+        "sec/a.md": "---\ntitle: Meta title\n---\n\n[b](b.md)\n",
+        "sec/b.md": "Only text [home](../index.md)\n",
+    }
+
+    publish(docs, nav=None)()
+
+    assert 'ri:content-title="Meta title"' in confluence.find("Start")["body"]
+    assert 'ri:content-title="B"' in confluence.find("Meta title")["body"]
+    assert 'ri:content-title="Start"' in confluence.find("B")["body"]
+
+
+def test_cache_is_invalidated_by_renamed_link_target(publish, confluence, tmp_path):
+    docs = {**DOCS, "index.md": "# Home\n\n[intro](guide/intro.md)\n"}
+    cache_file = str(tmp_path / "cache.json")
+    publish(docs, cache_file=cache_file)()
+
+    renamed = [
+        NAV[0],
+        {
+            "Guide": [
+                {"Introduction": "guide/intro.md"},
+                {"Deep": [{"Inner": "guide/deep/inner.md"}]},
+            ]
+        },
+    ]
+    publish(docs, nav=renamed, cache_file=cache_file)()
+
+    body = confluence.find("Home")["body"]
+    assert 'ri:content-title="Introduction"' in body
+    assert confluence.find("Inner")["version"] == 1
+
+
+def git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_diff_publishes_changed_pages(publish, confluence, tmp_path, caplog):
+    docs = {**DOCS, "café.md": "# Café\n\nOpen\n"}
+    marker = tmp_path / "marker"
+    run = publish(docs, nav=NAV + [{"Café": "café.md"}], git_diff_marker=str(marker))
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "docs")
+    run()
+
+    (tmp_path / "docs" / "café.md").write_text("# Café\n\nClosed\n", encoding="utf-8")
+    caplog.clear()
+    caplog.set_level(logging.INFO, logger="mkdocs")
+    run()
+
+    assert "Publishing only pages affected by 1 changed file(s)" in caplog.text
+    assert "Closed" in confluence.find("Café")["body"]
+    assert confluence.find("Café")["version"] == 2
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_diff_shards_create_new_sections(publish, confluence, tmp_path):
+    docs = {"index.md": "# Home\n", "a/one.md": "# One\n"}
+    publish(docs, nav=None)()
+    (tmp_path / ".gitignore").write_text("mkdocs.yml\nsite/\n", encoding="utf-8")
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "docs")
+
+    new_docs = {"b/two.md": "# Two\n"}
+    publish(new_docs, nav=None, git_diff_base="HEAD", shard="0/1")()
+    publish(new_docs, nav=None, git_diff_base="HEAD", shard="1/1")()
+
+    assert parent_title(confluence, "B") == "Root"
+    assert parent_title(confluence, "Two") == "B"
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_diff_marker_is_not_advanced_by_shard_0(publish, tmp_path):
+    marker = tmp_path / "marker"
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "commit", "-q", "--allow-empty", "-m", "init")
+
+    publish(git_diff_marker=str(marker), shard="0/2")()
+    assert not marker.exists()
+
+    publish(git_diff_marker=str(marker), shard="1/2")()
+    assert marker.exists()
+
+
+def test_shards_split_pages_by_directory(publish, confluence):
+    docs = {"index.md": "# Home\n"}
+    for section in "abcd":
+        for i in range(2):
+            docs[f"{section}/{i}.md"] = f"# {section.upper()}{i}\n"
+    sections = {"A", "B", "C", "D"}
+    creates = ("POST /wiki/rest/api/content", "POST /wiki/api/v2/pages")
+
+    requests = publish(docs, nav=None, shard="0/3")()
+    assert {p["title"] for p in confluence.pages.values()} == {"Root"} | sections
+    assert len([r for r in requests if r.rstrip("/") in creates]) == len(sections)
+
+    shard_of = {}
+    for index in (1, 2, 3):
+        before = {p["title"] for p in confluence.pages.values()}
+        requests = publish(docs, nav=None, shard=f"{index}/3")()
+        created = {p["title"] for p in confluence.pages.values()} - before
+        assert len([r for r in requests if r.rstrip("/") in creates]) == len(created)
+        shard_of.update({title: index for title in created})
+
+    assert set(shard_of) == {"Home"} | {f"{s}{i}" for s in sections for i in range(2)}
+    for section in sections:
+        assert shard_of[f"{section}0"] == shard_of[f"{section}1"]
+        assert parent_title(confluence, f"{section}0") == section
+    assert len(set(shard_of.values())) > 1
@@ -0,0 +1,105 @@
+import mistune
+import pytest
+
+from mkdocs_with_confluence.renderer import PageLinkRenderer, resolve_page_link
+
+
+@pytest.fixture
+def renderer():
+    renderer = PageLinkRenderer(space="SP", use_xhtml=True)
+    renderer.page_titles = {
+        "index.md": "Home",
+        "guide/intro.md": "Intro",
+        "guide/deep/inner.md": "Inner & Co",
+    }
+    return renderer
+
+
+def render(renderer, src_uri, markdown):
+    renderer.reinit(src_uri)
+    return mistune.Markdown(renderer=renderer)(markdown)
+
+
+@pytest.mark.parametrize(
+    "src_uri, href, target",
+    [
+        ("index.md", "guide/intro.md", "guide/intro.md"),
+        ("guide/deep/inner.md", "../../index.md#top", "index.md"),
+        ("guide/intro.md", "./deep/inner.md", "guide/deep/inner.md"),
+        ("guide/intro.md", "my%20page.md", "guide/my page.md"),
+        ("index.md", "https://example.com/a.md", None),
+        ("index.md", "image.png", None),
+    ],
+)
+def test_resolve_page_link(src_uri, href, target):
+    assert resolve_page_link(src_uri, href) == target
+
+
+def test_page_link(renderer):
+    body = render(renderer, "guide/intro.md", "See [the *start*](../index.md#top).")
+
+    assert (
+        '<ac:link ac:anchor="top"><ri:page ri:space-key="SP" ri:content-title="Home" />'
+        "<ac:link-body>the <em>start</em></ac:link-body></ac:link>"
+    ) in body
+    assert renderer.page_links == ["Home"]
+
+
+def test_page_link_escapes_title(renderer):
+    body = render(renderer, "index.md", "[](guide/deep/inner.md)")
+
+    assert 'ri:content-title="Inner &amp; Co"' in body
+    assert "<ac:link-body>Inner &amp; Co</ac:link-body>" in body
+
+
+def test_reference_page_link(renderer):
+    body = render(renderer, "index.md", "[Intro][intro]\n\n[intro]: guide/intro.md\n")
+
+    assert 'ri:content-title="Intro"' in body
+
+
+def test_unresolved_page_link(renderer):
+    body = render(renderer, "index.md", "[Gone](gone.md)")
+
+    assert '<a href="gone.md">Gone</a>' in body
+    assert renderer.unresolved_links == ["gone.md"]
+    assert renderer.page_links == []
+
+
+def test_other_links_are_untouched(renderer):
+    body = render(renderer, "index.md", "[Web](https://example.com/x.md)")
+
+    assert '<a href="https://example.com/x.md">Web</a>' in body
+    assert renderer.unresolved_links == []
+
+
+def test_links_in_code_are_not_rewritten(renderer):
+    body = render(
+        renderer,
+        "index.md",
+        "Use `[x](guide/intro.md)` inline.\n\n```md\n[x](guide/intro.md)\n```\n",
+    )
+
+    assert "<code>[x](guide/intro.md)</code>" in body
+    assert "<![CDATA[[x](guide/intro.md)]]>" in body
+    assert "ac:link" not in body
+    assert renderer.page_links == []
+
+
+def test_many_page_links(renderer):
+    renderer.page_titles.update({f"p{i}.md": f"Page {i}" for i in range(12)})
+
+    body = render(renderer, "index.md", " ".join(f"[{i}](p{i}.md)" for i in range(12)))
+
+    for i in range(12):
+        assert f'ri:content-title="Page {i}" /><ac:link-body>{i}</ac:link-body>' in body
+    assert renderer.page_links == [f"Page {i}" for i in range(12)]
+
+
+def test_reinit_resets_collected_links(renderer):
+    render(renderer, "index.md", "[a](guide/intro.md) [b](gone.md)")
+
+    renderer.reinit("index.md")
+
+    assert renderer.page_links == []
+    assert renderer.unresolved_links == []
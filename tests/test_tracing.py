@@ -0,0 +1,60 @@
+import json
+
+from mkdocs_with_confluence.tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer()
+
+    with tracer.span("work", page="Home"):
+        pass
+    tracer.dump(str(tmp_path / "trace.json"))
+
+    assert tracer.events == []
+    assert not (tmp_path / "trace.json").exists()
+
+
+def test_nested_spans_inherit_page():
+    tracer = Tracer()
+    tracer.enable()
+
+    with tracer.span("outer", page="Home"):
+        with tracer.span("inner", cat="http"):
+            pass
+    with tracer.span("after"):
+        pass
+
+    events = {e["name"]: e for e in tracer.events}
+    assert events["inner"]["args"] == {"page": "Home"}
+    assert events["outer"]["args"] == {"page": "Home"}
+    assert events["after"]["args"] == {}
+    assert events["outer"]["ph"] == "X"
+    assert events["outer"]["ts"] <= events["inner"]["ts"]
+    assert events["outer"]["dur"] >= events["inner"]["dur"]
+
+
+def test_build_writes_trace(site, tmp_path):
+    trace_file = tmp_path / "out" / "trace.json"
+    site(
+        {"index.md": "# Home\n\n```mermaid\ngraph TD; A-->B\n```\n"},
+        trace_file=str(trace_file),
+    )()
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    by_cat = {}
+    for e in events:
+        by_cat.setdefault(e["cat"], []).append(e)
+
+    hooks = {e["name"]: e for e in by_cat["hook"]}
+    assert {"on_page_markdown", "on_post_build"} <= set(hooks)
+    assert hooks["on_page_markdown"]["args"]["page"] == "Home"
+
+    assert [e["args"]["page"] for e in by_cat["convert"]] == ["Home"]
+    assert by_cat["sleep"] and all(e["args"]["seconds"] for e in by_cat["sleep"])
+
+    http = {e["name"] for e in by_cat["http"]}
+    assert "GET /wiki/rest/api/content" in http
+    assert "POST /wiki/rest/api/contentbody/convert/storage" in http
+    page_requests = [e for e in by_cat["http"] if e["args"].get("page") == "Home"]
+    assert page_requests
+    assert all(e["args"]["url"].startswith("http://") for e in by_cat["http"])